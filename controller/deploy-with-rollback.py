@@ -8,10 +8,14 @@ and automatic rollback on failure.
 """
 
 import requests
+import shutil
+import threading
 import time
 import sys
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 
 
 class Colors:
@@ -24,176 +28,376 @@ class Colors:
     END = '\033[0m'
 
 
+@dataclass(slots=True)
+class RegionSpec:
+    """One region's compose service name, host port and rollout state.
+
+    Keeping everything per-region in one record replaces the old
+    regions list / port_map dict / deployed_regions list trio and gives
+    worker threads a single object to flag under the lock.
+    """
+    name: str
+    port: int
+    deployed: bool = False
+    deploy_ok_at: float | None = None
+
+
 class Deployer:
     def __init__(self, version, failure_rate=0.0):
         self.version = version
         self.failure_rate = failure_rate
-        self.deployed_regions = []
-        self.current_version = self._detect_current_version()  # ← Changed this
+        self._deployed_lock = threading.Lock()
+        self._project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # --project-directory instead of cwd= on the subprocess calls:
+        # together with close_fds=False and a pre-resolved executable
+        # path (posix_spawn is skipped for bare program names) this
+        # keeps CPython on the posix_spawn fast path rather than
+        # fork+exec per docker call.
+        self._compose = [shutil.which('docker') or 'docker', 'compose',
+                         '--project-directory', self._project_dir]
+        self._current_version_cached = None
         self.regions = [
-            'region-us-west',
-            'region-us-east',
-            'region-eu-west',
-            'region-ap-south'
+            RegionSpec('region-us-west', 8081),
+            RegionSpec('region-us-east', 8082),
+            RegionSpec('region-eu-west', 8083),
+            RegionSpec('region-ap-south', 8084)
         ]
-        self.port_map = {
-            'region-us-west': 8081,
-            'region-us-east': 8082,
-            'region-eu-west': 8083,
-            'region-ap-south': 8084
-        }
+
+        # One session for every probe: keep-alive amortizes the TCP
+        # handshake across health checks, canary polls and verifies.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=len(self.regions),
+            pool_maxsize=len(self.regions) * 2,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+
+        self.current_version = self._detect_current_version()  # ← Changed this
 
     def _detect_current_version(self):
-        """Detect what version is currently deployed"""
+        """Detect what version is currently deployed (cached after first probe)"""
+        if self._current_version_cached is not None:
+            return self._current_version_cached
+
         try:
-            response = requests.get('http://localhost:8081/', timeout=5)
-            data = response.json()
-            current = data.get('version', 'v1')
+            response = self.session.get('http://localhost:8081/', timeout=5)
+            # Newer service builds expose the version as a header; fall
+            # back to parsing the body for containers that predate it.
+            current = response.headers.get('X-Service-Version')
+            if current is None:
+                current = response.json().get('version', 'v1')
             print(f"{Colors.BLUE}Detected current version: {current}{Colors.END}")
-            return current
         except Exception as e:
             print(f"{Colors.YELLOW}Could not detect current version, assuming v1{Colors.END}")
-            return 'v1'
+            current = 'v1'
 
-    def health_check(self, region, retries=3):
-        """Check health with retries"""
-        port = self.port_map[region]
+        self._current_version_cached = current
+        return current
 
-        for attempt in range(retries):
-            try:
-                response = requests.get(f'http://localhost:{port}/health', timeout=5)
-                data = response.json()
+    def _wait_until_ready(self, port, timeout=8.0):
+        """Poll the service until it answers, capped at `timeout` seconds.
 
-                if response.status_code == 200 and data['status'] == 'healthy':
-                    print(
-                        f"    {Colors.GREEN}✓ Attempt {attempt + 1}: Healthy - version={data.get('version')}{Colors.END}")
+        Containers are usually up well under the old fixed 8s wait, so
+        poll every 200ms and return as soon as the service responds.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                response = self.session.get(f'http://localhost:{port}/', timeout=0.5)
+                if response.ok:
                     return True
-                else:
-                    print(f"    {Colors.RED}✗ Attempt {attempt + 1}: Unhealthy - {data}{Colors.END}")
-            except Exception as e:
-                print(f"    {Colors.RED}✗ Attempt {attempt + 1}: Error - {e}{Colors.END}")
+            except Exception:
+                pass
+            time.sleep(0.2)
+        return False
 
-            time.sleep(2)
+    def _probe_health(self, port, attempt, delay, satisfied):
+        """Single health probe, optionally delayed by `delay` seconds.
+
+        The delay doubles as an interruptible wait: if another probe
+        already reported healthy, this one returns without firing.
+        """
+        if delay and satisfied.wait(delay):
+            return False
+
+        try:
+            response = self.session.get(f'http://localhost:{port}/health', timeout=5)
+            data = response.json()
+
+            if response.status_code == 200 and data['status'] == 'healthy':
+                print(
+                    f"    {Colors.GREEN}✓ Attempt {attempt}: Healthy - version={data.get('version')}{Colors.END}")
+                satisfied.set()
+                return True
+            else:
+                print(f"    {Colors.RED}✗ Attempt {attempt}: Unhealthy - {data}{Colors.END}")
+        except Exception as e:
+            print(f"    {Colors.RED}✗ Attempt {attempt}: Error - {e}{Colors.END}")
 
         return False
 
-    def deploy_region(self, region):
-        """Deploy to one region"""
-        print(f"\n{Colors.BLUE}{'=' * 50}")
-        print(f"Deploying {self.version} to {region}")
-        print(f"{'=' * 50}{Colors.END}")
+    def health_check(self, spec, retries=3):
+        """Check health with staggered, concurrent retries.
+
+        Retries still launch 2 seconds apart, but they overlap instead
+        of running serially: the healthy case returns on the first
+        success exactly as before, while the all-fail case is bounded by
+        the last probe's round trip rather than the sum of all of them.
+        """
+        port = spec.port
+        satisfied = threading.Event()
 
-        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if retries == 1:
+            return self._probe_health(port, 1, 0.0, satisfied)
 
+        executor = ThreadPoolExecutor(max_workers=retries)
+        try:
+            futures = [
+                executor.submit(self._probe_health, port, attempt + 1,
+                                attempt * 2.0, satisfied)
+                for attempt in range(retries)
+            ]
+            for future in as_completed(futures):
+                if future.result():
+                    return True
+            return False
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start_regions(self, specs):
+        """(Re)create the given regions with a single compose call.
+
+        --force-recreate already replaces the old container, so the
+        separate `docker compose rm -sf` is unnecessary, and batching N
+        regions into one call pays the CLI + daemon overhead once.
+        """
         # CRITICAL: Set env vars AND export them for subprocess
         env = os.environ.copy()
         env['VERSION'] = self.version
         env['FAILURE_RATE'] = str(self.failure_rate)
 
         try:
-            print(f"  → Stopping and removing old container...")
             subprocess.run(
-                ['docker', 'compose', 'rm', '-sf', region],
+                self._compose + ['up', '-d', '--no-deps', '--force-recreate',
+                                 '--remove-orphans'] + [spec.name for spec in specs],
                 env=env,
-                cwd=project_dir,
-                capture_output=True
-            )
-
-            print(f"  → Starting container with VERSION={self.version}...")
-            subprocess.run(
-                ['docker', 'compose', 'up', '-d', '--no-deps', '--force-recreate', region],
-                env=env,
-                cwd=project_dir,
+                close_fds=False,
                 check=True,
-                capture_output=True,
-                text=True
+                # Success output is never read: skip the stdout pipe and
+                # the UTF-8 decode, keep stderr raw for the failure path.
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
             )
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"  {Colors.RED}✗ Deploy failed{Colors.END}")
+            if e.stderr:
+                print(f"  Error: {e.stderr.decode(errors='replace')}")
+            return False
 
-            print(f"  → Waiting 8 seconds for service to start...")
-            time.sleep(8)
-
-            # Verify version
-            port = self.port_map[region]
-            try:
-                resp = requests.get(f'http://localhost:{port}/', timeout=5)
+    def _verify_version(self, spec):
+        """Verify a region reports the expected version"""
+        try:
+            resp = self.session.get(f'http://localhost:{spec.port}/', timeout=5)
+            actual_version = resp.headers.get('X-Service-Version')
+            if actual_version is None:
+                # Older service builds only report the version in the body.
                 actual_version = resp.json().get('version')
-                print(f"  → Verified running version: {actual_version}")
+            print(f"  → Verified running version: {actual_version}")
 
-                if actual_version != self.version:
-                    print(
-                        f"  {Colors.RED}✗ Version mismatch! Expected {self.version}, got {actual_version}{Colors.END}")
-                    return False
+            if actual_version != self.version:
+                print(
+                    f"  {Colors.RED}✗ Version mismatch! Expected {self.version}, got {actual_version}{Colors.END}")
+                return False
 
-            except Exception as e:
-                print(f"  {Colors.YELLOW}⚠ Could not verify version: {e}{Colors.END}")
+        except Exception as e:
+            print(f"  {Colors.YELLOW}⚠ Could not verify version: {e}{Colors.END}")
 
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"  {Colors.RED}✗ Deploy failed{Colors.END}")
-            if e.stderr:
-                print(f"  Error: {e.stderr}")
+        return True
+
+    def deploy_region(self, spec):
+        """Deploy to one region"""
+        print(f"\n{Colors.BLUE}{'=' * 50}")
+        print(f"Deploying {self.version} to {spec.name}")
+        print(f"{'=' * 50}{Colors.END}")
+
+        print(f"  → Starting container with VERSION={self.version}...")
+        if not self._start_regions([spec]):
             return False
 
+        print(f"  → Waiting for service to start (up to 8s)...")
+        self._wait_until_ready(spec.port)
+
+        return self._verify_version(spec)
+
     def rollback_all(self):
         """Rollback all deployed regions to previous version"""
         print(f"\n{Colors.RED}{Colors.BOLD}{'=' * 50}")
         print(f"🔄 INITIATING AUTOMATIC ROLLBACK")
         print(f"{'=' * 50}{Colors.END}")
 
-        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
         env = os.environ.copy()
         env['VERSION'] = self.current_version
         env['FAILURE_RATE'] = '0.0'
 
-        for region in self.deployed_regions:
-            print(f"\n{Colors.YELLOW}Rolling back {region} to {self.current_version}...{Colors.END}")
-            subprocess.run(
-                ['docker', 'compose', 'up', '-d', '--no-deps', '--force-recreate', region],
-                env=env,
-                cwd=project_dir,
-                capture_output=True
-            )
-            time.sleep(5)
-            print(f"  {Colors.GREEN}✓ {region} rolled back{Colors.END}")
+        deployed = [spec for spec in self.regions if spec.deployed]
+        if not deployed:
+            return
+
+        # Roll every region back at once: during an outage the serial
+        # per-region wait is exactly the wrong place to spend wall clock.
+        with ThreadPoolExecutor(max_workers=len(deployed)) as executor:
+            futures = {
+                executor.submit(self._rollback_region, spec, env): spec
+                for spec in deployed
+            }
+            for future in as_completed(futures):
+                spec = futures[future]
+                future.result()
+                print(f"  {Colors.GREEN}✓ {spec.name} rolled back{Colors.END}")
+
+    def _rollback_region(self, spec, env):
+        """Recreate one region at the stable version and wait for it"""
+        print(f"\n{Colors.YELLOW}Rolling back {spec.name} to {self.current_version}...{Colors.END}")
+        subprocess.run(
+            self._compose + ['up', '-d', '--no-deps', '--force-recreate', spec.name],
+            env=env,
+            close_fds=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self._wait_until_ready(spec.port, timeout=5.0)
+
+    def _validate_region(self, spec):
+        """Wait for an already-started region, then verify and health check it"""
+        print(f"  → Waiting for {spec.name} to start (up to 8s)...")
+        self._wait_until_ready(spec.port)
+
+        if not self._verify_version(spec):
+            return False
+
+        print(f"\n{Colors.BOLD}Health checking {spec.name}...{Colors.END}")
+        if not self.health_check(spec):
+            print(f"\n{Colors.RED} Health check failed!{Colors.END}")
+            return False
+
+        with self._deployed_lock:
+            spec.deploy_ok_at = time.monotonic()
+
+        print(f"\n{Colors.GREEN}✓ {spec.name} deployed successfully{Colors.END}")
+        return True
+
+    def _deploy_and_validate(self, spec, canary=False):
+        """Deploy one region and run its health checks.
+
+        Thread-safe: only touches shared state (the region's spec) under
+        the lock, everything else is subprocess/HTTP calls.
+        """
+        if not self.deploy_region(spec):
+            print(f"\n{Colors.RED} Deployment failed!{Colors.END}")
+            return False
+
+        with self._deployed_lock:
+            spec.deployed = True
+
+        print(f"\n{Colors.BOLD}Health checking {spec.name}...{Colors.END}")
+        if not self.health_check(spec):
+            print(f"\n{Colors.RED} Health check failed!{Colors.END}")
+            return False
+
+        # Canary: first region gets extra monitoring
+        if canary:
+            print(f"\n{Colors.YELLOW}🐤 CANARY DEPLOYMENT{Colors.END}")
+            print(f"  First region deployed - monitoring for 10 seconds...")
+            # Deadline-driven monitor: sample every 500ms until the 10s
+            # window closes, giving ~20 samples at the same wall-clock
+            # budget the old five fixed 2s sleeps bought 5.
+            deadline = time.monotonic() + 10.0
+            while time.monotonic() < deadline:
+                if not self.health_check(spec, retries=1):
+                    print(f"\n{Colors.RED} Canary monitoring failed!{Colors.END}")
+                    return False
+                time.sleep(max(0.0, min(0.5, deadline - time.monotonic())))
+            print(f"{Colors.GREEN}✓ Canary validation successful!{Colors.END}")
+
+        with self._deployed_lock:
+            spec.deploy_ok_at = time.monotonic()
+
+        print(f"\n{Colors.GREEN}✓ {spec.name} deployed successfully{Colors.END}")
+        return True
+
+    def _warm_docker(self):
+        """Build the region image up front so each `up` is a pure start.
+
+        Without this, the first region's readiness window also absorbs
+        the image build/pull, skewing canary timing and risking a
+        spurious rollback on cold starts. Best effort: a real failure
+        will surface on the subsequent `up` call anyway.
+        """
+        print(f"{Colors.BLUE}Warming docker: pre-building region images...{Colors.END}")
+        env = os.environ.copy()
+        env['VERSION'] = self.version
+        env['FAILURE_RATE'] = str(self.failure_rate)
+        subprocess.run(
+            self._compose + ['build'] + [spec.name for spec in self.regions],
+            env=env,
+            close_fds=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
 
     def deploy(self):
         """Main deployment with rollback"""
         print(f"\n{Colors.BOLD}Starting deployment of {self.version}{Colors.END}")
         print(f"Failure rate: {self.failure_rate}")
 
-        for i, region in enumerate(self.regions):
-            # Deploy
-            if not self.deploy_region(region):
-                print(f"\n{Colors.RED} Deployment failed!{Colors.END}")
+        try:
+            self._warm_docker()
+
+            # Canary region stays sequential: nothing else moves until it passes.
+            if not self._deploy_and_validate(self.regions[0], canary=True):
                 self.rollback_all()
                 return False
 
-            self.deployed_regions.append(region)
+            # Remaining regions target independent containers: start them
+            # all with one compose call, then validate them concurrently.
+            rest = self.regions[1:]
+            print(f"\n{Colors.BLUE}{'=' * 50}")
+            print(f"Deploying {self.version} to {', '.join(spec.name for spec in rest)}")
+            print(f"{'=' * 50}{Colors.END}")
+            # Mark the whole batch as deployed before starting it: if
+            # compose fails after recreating only some of these regions,
+            # they are already running the new version and rollback must
+            # still cover them.
+            with self._deployed_lock:
+                for spec in rest:
+                    spec.deployed = True
+
+            if not self._start_regions(rest):
+                print(f"\n{Colors.RED} Deployment failed!{Colors.END}")
+                self.rollback_all()
+                return False
 
-            # Health check
-            print(f"\n{Colors.BOLD}Health checking {region}...{Colors.END}")
-            if not self.health_check(region):
-                print(f"\n{Colors.RED} Health check failed!{Colors.END}")
+            with ThreadPoolExecutor(max_workers=len(rest)) as executor:
+                futures = [executor.submit(self._validate_region, spec)
+                           for spec in rest]
+                failed = False
+                for future in as_completed(futures):
+                    if not future.result():
+                        failed = True
+                        for pending in futures:
+                            pending.cancel()
+                        break
+
+            if failed:
                 self.rollback_all()
                 return False
 
-            # Canary: first region gets extra monitoring
-            if i == 0:
-                print(f"\n{Colors.YELLOW}🐤 CANARY DEPLOYMENT{Colors.END}")
-                print(f"  First region deployed - monitoring for 10 seconds...")
-                for check in range(5):
-                    time.sleep(2)
-                    if not self.health_check(region, retries=1):
-                        print(f"\n{Colors.RED} Canary monitoring failed!{Colors.END}")
-                        self.rollback_all()
-                        return False
-                print(f"{Colors.GREEN}✓ Canary validation successful!{Colors.END}")
-
-            print(f"\n{Colors.GREEN}✓ {region} deployed successfully{Colors.END}")
-
-        print(f"\n{Colors.BOLD}{Colors.GREEN}✅ Deployment complete!{Colors.END}")
-        return True
+            print(f"\n{Colors.BOLD}{Colors.GREEN}✅ Deployment complete!{Colors.END}")
+            return True
+        finally:
+            self.session.close()
 
 
 def main():
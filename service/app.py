@@ -1,53 +1,129 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, request
+import hashlib
+import json
 import os
 import random
+import threading
+from dataclasses import dataclass
+
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    # orjson is optional (no wheels on every runtime); stdlib json
+    # produces identical bytes for these flat dicts, just slower.
+    def _dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 app = Flask(__name__)
 
-VERSION = os.getenv('VERSION', 'v1')
-REGION = os.getenv('REGION', 'unknown')
-FAILURE_RATE = float(os.getenv('FAILURE_RATE', '0.0'))  # Add this
+
+@dataclass(slots=True, frozen=True)
+class Cfg:
+    """Immutable service configuration, read once from the environment"""
+    version: str
+    region: str
+    failure_rate: float
+
+
+CFG = Cfg(
+    version=os.getenv('VERSION', 'v1'),
+    region=os.getenv('REGION', 'unknown'),
+    failure_rate=float(os.getenv('FAILURE_RATE', '0.0'))
+)
+
+# With the production default of 0.0 the RNG can never trigger, so skip
+# it entirely instead of drawing a random number per /health request.
+_INJECT_FAILURES = CFG.failure_rate > 0.0
+
+# The module-level random functions share one locked RNG; under a
+# threaded WSGI server that lock serializes /health handlers. Give each
+# worker thread its own Random instance instead.
+_TLS = threading.local()
+
+
+def _thread_random():
+    rnd = getattr(_TLS, 'rnd', None)
+    if rnd is None:
+        rnd = _TLS.rnd = random.Random()
+    return rnd
+
+# The config never changes after startup, so the happy-path response
+# bodies are constants: build the bytes once at import time instead of
+# re-serializing them on every request.
+_HOME_BODY = _dumps({
+    'status': 'running',
+    'version': CFG.version,
+    'region': CFG.region
+})
+
+_HEALTHY_BODY = _dumps({
+    'status': 'healthy',
+    'version': CFG.version,
+    'region': CFG.region
+})
+
+_METRICS_BODY = f"""# HELP service_up Service is up
+# TYPE service_up gauge
+service_up{{version="{CFG.version}",region="{CFG.region}"}} 1
+
+# HELP service_info Service information
+# TYPE service_info gauge
+service_info{{version="{CFG.version}",region="{CFG.region}"}} 1
+""".encode('utf-8')
+
+# The bodies are immutable for the container's lifetime, so their ETags
+# are too: repeat probes can get a bodyless 304 instead of the payload.
+_HOME_ETAG = hashlib.md5(_HOME_BODY).hexdigest()
+_METRICS_ETAG = hashlib.md5(_METRICS_BODY).hexdigest()
+
+
+@app.after_request
+def _add_probe_headers(response, cfg=CFG):
+    # Version and region are immutable per container: expose them as
+    # headers so probes can read them without parsing the body (or via
+    # HEAD with no body at all).
+    response.headers['X-Service-Version'] = cfg.version
+    response.headers['X-Service-Region'] = cfg.region
+    return response
 
 
 @app.route('/')
 def home():
-    return jsonify({
-        'status': 'running',
-        'version': VERSION,
-        'region': REGION
-    })
+    response = Response(_HOME_BODY, mimetype='application/json')
+    response.set_etag(_HOME_ETAG)
+    # The body never changes while the container lives; let repeat
+    # probes within a scrape interval reuse it.
+    response.headers['Cache-Control'] = 'public, max-age=5'
+    return response.make_conditional(request)
 
 
 @app.route('/health')
-def health():
-    # Simulate failures
-    if random.random() < FAILURE_RATE:
-        return jsonify({
+def health(cfg=CFG):
+    # Simulate failures. Binding cfg as a default argument turns the
+    # per-request config reads into local-variable loads.
+    if _INJECT_FAILURES and _thread_random().random() < cfg.failure_rate:
+        return Response(_dumps({
             'status': 'unhealthy',
-            'version': VERSION,
-            'region': REGION
-        }), 503
+            'version': cfg.version,
+            'region': cfg.region
+        }), status=503, mimetype='application/json')
 
-    return jsonify({
-        'status': 'healthy',
-        'version': VERSION,
-        'region': REGION
-    })
+    return Response(_HEALTHY_BODY, mimetype='application/json')
 
 
 @app.route('/metrics')
 def metrics():
-    metrics_text = f"""# HELP service_up Service is up
-# TYPE service_up gauge
-service_up{{version="{VERSION}",region="{REGION}"}} 1
-
-# HELP service_info Service information
-# TYPE service_info gauge
-service_info{{version="{VERSION}",region="{REGION}"}} 1
-"""
-    return metrics_text, 200, {'Content-Type': 'text/plain'}
+    response = Response(_METRICS_BODY, mimetype='text/plain')
+    response.set_etag(_METRICS_ETAG)
+    return response.make_conditional(request)
 
 
 if __name__ == '__main__':
-    print(f"Starting service: version={VERSION}, region={REGION}, failure_rate={FAILURE_RATE}")
-    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+    from waitress import serve
+
+    print(f"Starting service: version={CFG.version}, region={CFG.region}, "
+          f"failure_rate={CFG.failure_rate}")
+    serve(app, host='0.0.0.0', port=8080, threads=8)